@@ -8,7 +8,9 @@ WIFI_PASSWORD = "YOUR_WIFI_PASSWORD"
 # La Marzocco Credentials
 LM_EMAIL = "your_email@example.com"
 LM_PASSWORD = "your_password"
-LM_MACHINE_ID = "your_machine_serial_number" # e.g., "LM123456"
+# One entry per machine; with more than one, a machine selector appears in the UI
+LM_MACHINE_IDS = ["your_machine_serial_number"] # e.g., ["LM123456", "LM654321"]
+LM_BASE_URL = None # None = official gateway. e.g., "http://192.168.1.50:8080/v1/home" for tools/fake_gateway.py
 
 # Hardware Pinout (Waveshare ESP32-S3-Knob-Touch-LCD-1.8)
 # PLEASE VERIFY THESE PINS WITH YOUR SPECIFIC BOARD REVISION
@@ -39,3 +41,4 @@ ENCODER_BTN = 42 # Placeholder - Verify
 
 # System
 DEBOUNCE_MS = 1000 # 1 second debounce for API calls
+STATUS_POLL_S = 30 # Each machine's status is refreshed this often (staggered)
@@ -0,0 +1,207 @@
+import uasyncio as asyncio
+import random
+import time
+from lib.http_pool import PoolTimeout
+
+# Defaults, tuned for a cloud gateway over home/café WiFi
+REQUEST_TIMEOUT_S = 10    # Deadline for a single attempt
+DEADLINE_S = 20           # Deadline for the whole call, retries and waits included
+MAX_ATTEMPTS = 4          # First try + 3 retries
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 8
+# Longer than DEADLINE_S on purpose: a Retry-After that doesn't fit in one
+# call fails that call, and every later call fails fast until it has passed
+RETRY_AFTER_CAP_S = 60    # Never stay quiet longer than this
+BREAKER_THRESHOLD = 5     # Consecutive failures before the breaker opens
+BREAKER_COOLDOWN_S = 30   # How long to fail fast before probing again
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def _retry_after_s(res):
+    # Only the delta-seconds form; HTTP dates need an RTC we can't trust
+    try:
+        return min(int(res.headers["retry-after"]), RETRY_AFTER_CAP_S)
+    except (KeyError, ValueError):
+        return None
+
+
+class RequestExecutor:
+    """Single path for every API call: deadlines, retries and a circuit breaker.
+
+    Only idempotent requests are retried after a failure the server may have
+    acted on. A 429 is always safe to retry since the request was refused.
+    """
+
+    def __init__(self, pool, timeout_s=REQUEST_TIMEOUT_S, deadline_s=DEADLINE_S, max_attempts=MAX_ATTEMPTS,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown_s=BREAKER_COOLDOWN_S):
+        self.pool = pool
+        self.timeout_s = timeout_s
+        self.deadline_ms = int(deadline_s * 1000)
+        self.max_attempts = max_attempts
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_ms = int(breaker_cooldown_s * 1000)
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._retry_at = None # ticks_ms before which the gateway asked us not to call
+
+        self.metrics = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "breaker_trips": 0,
+            "fast_fails": 0,
+            "blocked_ms": 0, # Time spent sleeping in backoff / Retry-After
+        }
+
+    @property
+    def offline(self):
+        # Stays offline until a probe actually succeeds
+        return self.state != CLOSED
+
+    def _allow(self):
+        if self.state == HALF_OPEN:
+            return False # A probe is already in flight
+        if self.state == OPEN:
+            if time.ticks_diff(time.ticks_ms(), self._opened_at) < self.breaker_cooldown_ms:
+                return False
+            # Cooldown over, let one probe through
+            self.state = HALF_OPEN
+        return True
+
+    def _on_success(self):
+        self._failures = 0
+        self.state = CLOSED
+
+    def _on_failure(self):
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.breaker_threshold:
+            if self.state != OPEN:
+                self.metrics["breaker_trips"] += 1
+                print("Circuit breaker open, gateway marked offline")
+            self.state = OPEN
+            self._opened_at = time.ticks_ms()
+
+    def _abandon_probe(self):
+        # A probe that never reached an answer proves nothing, so go back to
+        # failing fast for another cooldown rather than staying half-open
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self._opened_at = time.ticks_ms()
+
+    def _retry_wait_ms(self):
+        if self._retry_at is None:
+            return 0
+        wait_ms = time.ticks_diff(self._retry_at, time.ticks_ms())
+        if wait_ms <= 0:
+            self._retry_at = None
+            return 0
+        return wait_ms
+
+    def _backoff_s(self, attempt):
+        # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+        return random.random() * min(BACKOFF_CAP_S, BACKOFF_BASE_S * (2 ** attempt))
+
+    async def _sleep(self, seconds):
+        start = time.ticks_ms()
+        await asyncio.sleep(seconds)
+        self.metrics["blocked_ms"] += time.ticks_diff(time.ticks_ms(), start)
+
+    async def request(self, method, url, headers=None, data=None, idempotent=None):
+        if idempotent is None:
+            idempotent = method in ("GET", "HEAD", "PUT", "DELETE")
+        self.metrics["requests"] += 1
+        start = time.ticks_ms()
+
+        attempt = 0
+        while True:
+            # Honour a Retry-After from any earlier call: wait if it fits in
+            # this call's deadline, otherwise fail without bothering the gateway
+            wait_ms = self._retry_wait_ms()
+            if wait_ms:
+                if time.ticks_diff(time.ticks_ms(), start) + wait_ms >= self.deadline_ms:
+                    self.metrics["fast_fails"] += 1
+                    raise HTTPError(429, (wait_ms + 999) // 1000)
+                await self._sleep(wait_ms / 1000)
+
+            if not self._allow():
+                self.metrics["fast_fails"] += 1
+                raise CircuitOpenError("Gateway offline")
+            probing = self.state == HALF_OPEN
+
+            # Each attempt gets whatever is left of the call's deadline, at most
+            # timeout_s, for connecting and I/O. Queueing for one of the pool's
+            # sockets only counts against the deadline.
+            remaining_s = (self.deadline_ms - time.ticks_diff(time.ticks_ms(), start)) / 1000
+            try:
+                res = await self.pool.request(
+                    method, url, headers=headers, data=data,
+                    timeout_s=min(self.timeout_s, remaining_s), wait_s=remaining_s,
+                )
+            except PoolTimeout:
+                # Stuck behind our own requests; the gateway did nothing wrong
+                if probing:
+                    self._abandon_probe()
+                self.metrics["failures"] += 1
+                raise
+            except Exception as e: # OSError, asyncio.TimeoutError
+                err = e
+            except BaseException:
+                # Cancelled by the caller
+                if probing:
+                    self._abandon_probe()
+                raise
+            else:
+                if res.status_code < 400:
+                    self._on_success()
+                    return res
+                if res.status_code != 429 and res.status_code < 500:
+                    # The gateway is healthy, the request is wrong; retrying won't help
+                    self._on_success()
+                    raise HTTPError(res.status_code)
+                err = HTTPError(res.status_code, _retry_after_s(res))
+
+            # A 429 means the gateway is up but busy, so it counts as reachable
+            refused = isinstance(err, HTTPError) and err.status == 429
+            if refused:
+                self._on_success()
+                if err.retry_after is not None:
+                    # Shared with every other call, not just this one's retries
+                    self._retry_at = time.ticks_add(time.ticks_ms(), int(err.retry_after * 1000))
+            else:
+                self._on_failure()
+
+            attempt += 1
+            if attempt >= self.max_attempts or not (idempotent or refused) or self.state == OPEN:
+                self.metrics["failures"] += 1
+                raise err
+
+            if refused and err.retry_after is not None:
+                delay = err.retry_after
+            else:
+                delay = self._backoff_s(attempt)
+            # Don't start a wait whose retry would land past the deadline
+            elapsed_ms = time.ticks_diff(time.ticks_ms(), start)
+            if elapsed_ms + delay * 1000 >= self.deadline_ms:
+                self.metrics["failures"] += 1
+                raise err
+
+            self.metrics["retries"] += 1
+            print(f"Retrying {method} in {delay:.1f}s ({str(err) or type(err).__name__})")
+            await self._sleep(delay)
@@ -0,0 +1,200 @@
+import uasyncio as asyncio
+import ujson
+import time
+
+# Each TLS socket costs tens of KB of heap on the ESP32, so we cap how many
+# can be open at once and reuse them with HTTP keep-alive.
+MAX_CONNECTIONS = 2
+
+
+class PoolTimeout(Exception):
+    # Gave up waiting for a free socket; the server was never contacted
+    pass
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers # Lower-cased header names
+        self.content = body
+
+    def json(self):
+        return ujson.loads(self.content)
+
+
+def _split_url(url):
+    # "https://host[:port]/path" -> (host, port, use_ssl, path)
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    use_ssl = scheme == "https"
+    port = 443 if use_ssl else 80
+    if ":" in host:
+        host, port = host.split(":")
+        port = int(port)
+    return host, port, use_ssl, slash + path
+
+
+class ConnectionPool:
+    """Non-blocking HTTP/1.1 client shared by every machine.
+
+    urequests blocks the whole event loop, which makes it impossible to
+    poll several machines at once. This talks to the gateway over uasyncio
+    streams instead, keeping at most MAX_CONNECTIONS sockets alive.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._idle = {} # (host, port) -> [(reader, writer), ...]
+        self._open = 0
+        self._released = asyncio.Event()
+
+    async def _acquire(self, key, fresh=False, wait_s=None):
+        # Returns (conn, reused). conn is None when a new slot was reserved
+        # and the caller has to open the socket. fresh=True skips idle sockets
+        # for this host. wait_s bounds the wait for a slot (None = forever).
+        start = time.ticks_ms()
+        while True:
+            idle = self._idle.get(key)
+            if idle and not fresh:
+                return idle.pop(), True
+            if self._open >= self.max_connections:
+                # At capacity: an idle socket kept for some other host (or a
+                # stale one of ours) is worth less than a request waiting now
+                self._evict_idle()
+            if self._open < self.max_connections:
+                self._open += 1
+                return None, False
+            # All slots busy, wait for someone to give one back
+            self._released.clear()
+            if wait_s is None:
+                await self._released.wait()
+                continue
+            left_s = wait_s - time.ticks_diff(time.ticks_ms(), start) / 1000
+            try:
+                if left_s <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(self._released.wait(), left_s)
+            except asyncio.TimeoutError:
+                raise PoolTimeout("No free connection")
+
+    def _evict_idle(self):
+        for key, conns in self._idle.items():
+            if conns:
+                _, writer = conns.pop()
+                self._open -= 1
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+                return
+
+    def _release(self, key, conn, reuse):
+        if conn is None:
+            # Reserved slot whose connect never finished
+            self._open -= 1
+        elif reuse:
+            self._idle.setdefault(key, []).append(conn)
+        else:
+            self._open -= 1
+            try:
+                conn[1].close()
+            except Exception:
+                pass
+        self._released.set()
+
+    async def request(self, method, url, headers=None, data=None, timeout_s=None, wait_s=None):
+        # timeout_s covers connecting and talking to the server. Waiting for
+        # a free socket is bounded separately by wait_s, so a request stuck
+        # behind our own traffic never looks like a slow server.
+        host, port, use_ssl, path = _split_url(url)
+        key = (host, port)
+        body = data.encode() if isinstance(data, str) else (data or b"")
+
+        # Host carries the port unless it's the scheme's default
+        host_header = host if port == (443 if use_ssl else 80) else f"{host}:{port}"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host_header}", "Connection: keep-alive"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+        # Servers drop idle keep-alive sockets after their own timeout. If a
+        # reused socket dies before any response arrives, it was stale rather
+        # than the gateway failing, so try once more on a fresh connection.
+        fresh = False
+        started = None
+        while True:
+            conn, reused = await self._acquire(key, fresh, wait_s)
+            if started is None:
+                started = time.ticks_ms()
+            left_s = None
+            if timeout_s is not None:
+                left_s = timeout_s - time.ticks_diff(time.ticks_ms(), started) / 1000
+            reuse = False
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(
+                        asyncio.open_connection(host, port, ssl=use_ssl), left_s)
+                status_line, res = await asyncio.wait_for(
+                    self._exchange(conn, reused, head + body), left_s)
+                if status_line:
+                    reuse = res.headers.get("connection", "").lower() != "close"
+                    return res
+                if not reused:
+                    raise OSError("Connection closed by server")
+            finally:
+                self._release(key, conn, reuse)
+            fresh = True
+
+    async def _exchange(self, conn, reused, payload):
+        # Returns (status_line, response); an empty status line means a
+        # reused socket turned out to be dead before answering
+        reader, writer = conn
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status_line = await reader.readline()
+        except OSError:
+            if not reused:
+                raise
+            return b"", None
+        if not status_line:
+            return b"", None
+        return status_line, await self._read_response(reader, status_line)
+
+    async def _read_response(self, reader, status_line):
+        status = int(status_line.split(b" ")[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            # No framing, body runs until the socket closes
+            body = await reader.read(-1)
+            headers["connection"] = "close"
+
+        return Response(status, headers, body)
+
+    async def close(self):
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+                self._open -= 1
+        self._idle = {}
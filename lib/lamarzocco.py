@@ -1,25 +1,67 @@
-import urequests
 import ujson
 import uasyncio as asyncio
 import time
+from lib.http_pool import ConnectionPool
+from lib.executor import RequestExecutor
 
 BASE_URL = "https://gw-lmz.lamarzocco.com/v1/home"
 TOKEN_URL = "https://cms.lamarzocco.io/oauth/v2/token"
 
 class LamarzoccoLite:
-    def __init__(self, client_id, client_secret, email, password, machine_serial):
+    def __init__(self, client_id, client_secret, email, password, machine_serials, base_url=None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.email = email
         self.password = password
-        self.serial = machine_serial
         self.token = None
-        self.status = {}
+        self.base_url = base_url or BASE_URL # Override to point at a local stand-in server
         
-        # Debounce / Cooldown tracking
-        self.last_api_call = 0
+        # One client drives every machine on the account, sharing the token
+        # and the connection pool. A single serial string is still accepted.
+        if isinstance(machine_serials, str):
+            machine_serials = [machine_serials]
+        self.serials = list(machine_serials)
+        if not self.serials:
+            raise ValueError("At least one machine serial is required")
+        if len(set(self.serials)) != len(self.serials):
+            raise ValueError("Duplicate machine serial")
+        self.serial = self.serials[0] # Currently selected machine
+        self.pool = ConnectionPool()
+        # Every request goes through here for deadlines, retries and the breaker
+        self.executor = RequestExecutor(self.pool)
+        
+        # Per-machine cached status and debounce / cooldown tracking
+        # status_seq orders fetches by when they were started, so callers can
+        # tell a status that predates a command from one taken after it
+        self.machines = {}
+        for serial in self.serials:
+            self.machines[serial] = {"status": {}, "status_seq": 0, "last_api_call": 0}
+        self.status_seq = 0
         self.pending_updates = {}
 
+    @property
+    def status(self):
+        return self.machines[self.serial]["status"]
+
+    def _machine_serial(self, serial):
+        # Resolve None to the selected machine and reject unknown serials
+        # before anything goes out on the network
+        serial = serial or self.serial
+        if serial not in self.machines:
+            raise ValueError(f"Unknown machine: {serial}")
+        return serial
+
+    def select_machine(self, serial):
+        # Only switches which cached state we look at, no network involved
+        serial = self._machine_serial(serial)
+        self.serial = serial
+        return self.machines[serial]["status"]
+
+    @property
+    def offline(self):
+        # True while the circuit breaker is failing requests fast
+        return self.executor.offline
+
     async def connect(self):
         # Authenticate and get token
         # Note: This is a simplified auth flow. 
@@ -30,64 +72,92 @@ class LamarzoccoLite:
         # Placeholder for actual Auth logic
         self.token = "PLACEHOLDER_TOKEN" 
         print("Connected.")
+        # Prime every machine's cached status before the staggered polls start
+        await self.get_all_status()
 
-    async def get_status(self):
+    async def get_status(self, serial=None):
+        serial = self._machine_serial(serial)
         if not self.token:
             return None
-            
-        url = f"{BASE_URL}/machines/{self.serial}/status"
+        
+        url = f"{self.base_url}/machines/{serial}/status"
         headers = {"Authorization": f"Bearer {self.token}"}
+        seq = self.status_seq
+        self.status_seq += 1
         
         try:
-            # In asyncio, we might want to run this in a thread or use a non-blocking socket
-            # For simplicity in MicroPython, we often use urequests directly but it blocks.
-            # We can wrap it or accept the small block.
-            res = urequests.get(url, headers=headers)
-            self.status = res.json()
-            res.close()
-            return self.status
+            res = await self.executor.request("GET", url, headers=headers)
+            status = res.json()
+            self.machines[serial]["status"] = status
+            self.machines[serial]["status_seq"] = seq
+            return status
         except Exception as e:
-            print(f"Error fetching status: {e}")
+            print(f"Error fetching status for {serial}: {e}")
             return None
 
-    async def _send_command(self, endpoint, payload):
+    async def get_all_status(self):
+        # Fetch every machine at once; the pool caps how many sockets
+        # are actually open so heap use stays flat as machines are added.
+        results = await asyncio.gather(*[self.get_status(s) for s in self.serials])
+        return dict(zip(self.serials, results))
+
+    async def poll(self, interval_s):
+        # Staggered schedules: machine i is polled at offset i * interval / N,
+        # so requests are spread across the interval instead of bursting.
+        step = interval_s / len(self.serials)
+        tasks = [
+            self._poll_machine(serial, i * step, interval_s)
+            for i, serial in enumerate(self.serials)
+        ]
+        await asyncio.gather(*tasks)
+
+    async def _poll_machine(self, serial, offset_s, interval_s):
+        await asyncio.sleep(offset_s)
+        while True:
+            await self.get_status(serial)
+            await asyncio.sleep(interval_s)
+
+    async def _send_command(self, endpoint, payload, serial=None):
+        serial = self._machine_serial(serial)
         if not self.token:
             return
-            
-        url = f"{BASE_URL}/machines/{self.serial}/{endpoint}"
+        
+        url = f"{self.base_url}/machines/{serial}/{endpoint}"
         headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
         
         try:
-            res = urequests.post(url, headers=headers, data=ujson.dumps(payload))
-            res.close()
+            # Commands set absolute values, so repeating one is harmless
+            await self.executor.request("POST", url, headers=headers, data=ujson.dumps(payload), idempotent=True)
         except Exception as e:
-            print(f"Error sending command: {e}")
+            print(f"Error sending command to {serial}: {e}")
 
-    async def set_power(self, on):
-        await self._send_command("status", {"status": "ON" if on else "STANDBY"})
+    async def set_power(self, on, serial=None):
+        await self._send_command("status", {"status": "ON" if on else "STANDBY"}, serial)
 
-    async def set_temp(self, temp):
+    async def set_temp(self, temp, serial=None):
         # Debounce logic should be handled by the caller or a queue
-        # But we can enforce a cooldown here
+        # But we can enforce a per-machine cooldown here
+        machine = self.machines[self._machine_serial(serial)]
         now = time.time()
-        if now - self.last_api_call < 1:
+        if now - machine["last_api_call"] < 1:
             print("Rate limit: Skipping temp update")
             return
         
-        await self._send_command("configuration", {"boiler_target_temperature": temp})
-        self.last_api_call = now
+        await self._send_command("configuration", {"boiler_target_temperature": temp}, serial)
+        machine["last_api_call"] = now
 
-    async def set_steam(self, level):
+    async def set_steam(self, level, serial=None):
         # Level 1, 2, 3
-        await self._send_command("configuration", {"steam_level": level})
+        await self._send_command("configuration", {"steam_level": level}, serial)
 
-    async def set_preinfusion(self, enabled, k_on, k_off):
-        payload = {
-            "preinfusion_enabled": enabled,
-            "preinfusion_k_on": k_on,
-            "preinfusion_k_off": k_off
-        }
-        await self._send_command("configuration", payload)
+    async def set_preinfusion(self, enabled, k_on=None, k_off=None, serial=None):
+        # Timings are optional so the knob can toggle pre-infusion on its own
+        payload = {"preinfusion_enabled": enabled}
+        if k_on is not None:
+            payload["preinfusion_k_on"] = k_on
+        if k_off is not None:
+            payload["preinfusion_k_off"] = k_off
+        await self._send_command("configuration", payload, serial)
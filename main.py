@@ -21,6 +21,14 @@ async def connect_wifi():
         await asyncio.sleep(1)
     print("WiFi Connected:", wlan.ifconfig())
 
+async def run_client(lm_client):
+    # Strictly in order: WiFi, then auth (which primes every machine's
+    # status), then the staggered polls. Polling any earlier just trips
+    # the circuit breaker while the network is still coming up.
+    await connect_wifi()
+    # await lm_client.connect() # Uncomment when credentials set
+    await lm_client.poll(config.STATUS_POLL_S)
+
 async def main():
     # 1. Hardware Init
     # Display
@@ -109,15 +117,15 @@ async def main():
         client_secret="YOUR_CLIENT_SECRET", 
         email=config.LM_EMAIL, 
         password=config.LM_PASSWORD, 
-        machine_serial=config.LM_MACHINE_ID
+        machine_serials=config.LM_MACHINE_IDS,
+        base_url=config.LM_BASE_URL
     )
     
     # 3. UI Init
     ui = PlanetaryUI(disp_drv, touch_drv, enc_drv, lm_client)
     
     # 4. Start Tasks
-    asyncio.create_task(connect_wifi())
-    # asyncio.create_task(lm_client.connect()) # Uncomment when credentials set
+    asyncio.create_task(run_client(lm_client))
     
     print("Starting UI Loop...")
     await ui.loop()
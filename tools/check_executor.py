@@ -0,0 +1,262 @@
+# Desktop checks for lib/executor.py and lib/http_pool.py against the fake
+# gateway, run in-process with CPython:
+#
+#   python tools/check_executor.py
+#
+# uasyncio/ujson and time.ticks_* are shimmed with their CPython
+# equivalents. Each scenario sets the gateway's fault knobs and asserts the
+# breaker state and metrics it should produce.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.modules["uasyncio"] = asyncio
+sys.modules["ujson"] = json
+time.ticks_ms = lambda: int(time.monotonic() * 1000)
+time.ticks_diff = lambda a, b: a - b
+time.ticks_add = lambda a, b: a + b
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_gateway
+import lib.executor as executor
+from lib.executor import RequestExecutor, CircuitOpenError, HTTPError, CLOSED, OPEN
+from lib.http_pool import ConnectionPool, PoolTimeout
+
+executor.BACKOFF_BASE_S = 0.01
+executor.BACKOFF_CAP_S = 0.05
+
+FAULTS = dict(delay=0, error_rate=0, rate_limit_rate=0, retry_after=1,
+              drop_rate=0, hang_rate=0, down=False, idle_timeout=0)
+ARGS = argparse.Namespace(**FAULTS)
+
+
+def faults(**kw):
+    for name, value in FAULTS.items():
+        setattr(ARGS, name, kw.get(name, value))
+
+
+def make_executor(**kw):
+    opts = dict(timeout_s=0.5, deadline_s=5, breaker_threshold=3, breaker_cooldown_s=0.3)
+    opts.update(kw)
+    return RequestExecutor(ConnectionPool(), **opts)
+
+
+async def expect_raises(exc_type, coro):
+    try:
+        await coro
+    except exc_type as e:
+        return e
+    raise AssertionError(f"expected {exc_type.__name__}")
+
+
+async def check_healthy(url):
+    faults()
+    ex = make_executor()
+    res = await ex.request("GET", url)
+    assert res.status_code == 200 and res.json()["status"] == "ON"
+    assert ex.state == CLOSED
+    assert ex.metrics["requests"] == 1 and ex.metrics["retries"] == 0
+
+
+async def check_breaker_cycle(url):
+    faults(down=True)
+    ex = make_executor(max_attempts=10)
+    await expect_raises(HTTPError, ex.request("GET", url))
+    assert ex.state == OPEN, ex.state
+    assert ex.metrics["breaker_trips"] == 1
+    assert ex.metrics["retries"] == 2 # Opens on the third consecutive failure
+    assert ex.offline
+
+    # Open: fail fast without touching the gateway
+    await expect_raises(CircuitOpenError, ex.request("GET", url))
+    assert ex.metrics["fast_fails"] == 1
+
+    # Half-open probe fails: straight back to open, another trip
+    await asyncio.sleep(0.35)
+    await expect_raises(HTTPError, ex.request("GET", url))
+    assert ex.state == OPEN and ex.metrics["breaker_trips"] == 2
+
+    # Half-open probe succeeds: closed again
+    faults()
+    await asyncio.sleep(0.35)
+    await ex.request("GET", url)
+    assert ex.state == CLOSED and not ex.offline
+
+
+async def check_cancelled_probe(url):
+    faults(down=True)
+    ex = make_executor()
+    await expect_raises(HTTPError, ex.request("GET", url))
+    assert ex.state == OPEN
+
+    faults(hang_rate=1)
+    await asyncio.sleep(0.35)
+    probe = asyncio.create_task(ex.request("GET", url))
+    await asyncio.sleep(0.1)
+    probe.cancel()
+    await expect_raises(asyncio.CancelledError, probe)
+    assert ex.state == OPEN, ex.state
+
+    # Next cooldown lets a new probe through
+    faults()
+    await asyncio.sleep(0.35)
+    await ex.request("GET", url)
+    assert ex.state == CLOSED
+
+
+async def check_retry_after(url):
+    faults(rate_limit_rate=1, retry_after=1)
+    ex = make_executor(max_attempts=2)
+    err = await expect_raises(HTTPError, ex.request("GET", url))
+    assert err.status == 429 and err.retry_after == 1
+    assert ex.metrics["retries"] == 1
+    assert ex.metrics["blocked_ms"] >= 950, ex.metrics
+    assert ex.state == CLOSED # Rate limiting isn't an outage
+
+    # Retry-After is capped
+    cap = executor.RETRY_AFTER_CAP_S
+    executor.RETRY_AFTER_CAP_S = 0.2
+    try:
+        faults(rate_limit_rate=1, retry_after=3600)
+        ex = make_executor(max_attempts=2)
+        err = await expect_raises(HTTPError, ex.request("GET", url))
+        assert err.retry_after == 0.2
+        assert ex.metrics["blocked_ms"] < 1000, ex.metrics
+    finally:
+        executor.RETRY_AFTER_CAP_S = cap
+
+
+async def check_retry_after_shared(url):
+    # A short Retry-After is waited out by the next call, even a separate one
+    faults(rate_limit_rate=1, retry_after=1)
+    ex = make_executor(max_attempts=1)
+    await expect_raises(HTTPError, ex.request("GET", url))
+    faults()
+    start = time.monotonic()
+    await ex.request("GET", url)
+    assert time.monotonic() - start >= 0.95
+    assert ex.metrics["blocked_ms"] >= 950, ex.metrics
+
+    # One too long for the deadline makes later calls fail fast without a request
+    faults(rate_limit_rate=1, retry_after=30)
+    ex = make_executor(deadline_s=1)
+    await expect_raises(HTTPError, ex.request("GET", url))
+    faults()
+    for _ in range(5):
+        start = time.monotonic()
+        err = await expect_raises(HTTPError, ex.request("GET", url))
+        assert err.status == 429 and time.monotonic() - start < 0.05
+    assert ex.metrics["fast_fails"] == 5 and ex.state == CLOSED
+
+
+async def check_pool_queue(url):
+    # Eight calls through two sockets against a slow but healthy gateway:
+    # queueing for a socket is not the gateway's fault
+    faults(delay=0.4)
+    ex = make_executor(timeout_s=1)
+    results = await asyncio.gather(*[ex.request("GET", url) for _ in range(8)])
+    assert all(r.status_code == 200 for r in results)
+    assert ex.state == CLOSED and ex.metrics["breaker_trips"] == 0, ex.metrics
+
+    # With a deadline too short to get a socket, calls give up locally
+    ex = make_executor(timeout_s=1, deadline_s=0.6)
+    results = await asyncio.gather(*[ex.request("GET", url) for _ in range(8)],
+                                   return_exceptions=True)
+    assert any(isinstance(r, PoolTimeout) for r in results)
+    assert ex.state == CLOSED and ex.metrics["breaker_trips"] == 0, ex.metrics
+
+
+async def check_idempotency(url):
+    faults(error_rate=1)
+    ex = make_executor(breaker_threshold=100)
+    await expect_raises(HTTPError, ex.request("POST", url, data="{}"))
+    assert ex.metrics["retries"] == 0 and ex.metrics["failures"] == 1
+
+    await expect_raises(HTTPError, ex.request("POST", url, data="{}", idempotent=True))
+    assert ex.metrics["retries"] == ex.max_attempts - 1
+
+    # A 429 means the request was refused, so even a non-idempotent one is retried
+    faults(rate_limit_rate=1, retry_after=0)
+    ex = make_executor(max_attempts=2)
+    await expect_raises(HTTPError, ex.request("POST", url, data="{}"))
+    assert ex.metrics["retries"] == 1
+
+
+async def check_drops(url):
+    faults(drop_rate=1)
+    ex = make_executor(breaker_threshold=100)
+    await expect_raises(OSError, ex.request("GET", url))
+    assert ex.metrics["retries"] == ex.max_attempts - 1
+
+
+async def check_deadline(url):
+    faults(hang_rate=1)
+    ex = make_executor(timeout_s=0.3, deadline_s=0.5, breaker_threshold=100)
+    start = time.monotonic()
+    await expect_raises(asyncio.TimeoutError, ex.request("GET", url))
+    elapsed = time.monotonic() - start
+    assert elapsed < 0.7, elapsed
+
+    # A Retry-After past the deadline isn't waited for
+    faults(rate_limit_rate=1, retry_after=2)
+    ex = make_executor(deadline_s=1)
+    start = time.monotonic()
+    await expect_raises(HTTPError, ex.request("GET", url))
+    assert time.monotonic() - start < 0.5
+    assert ex.metrics["retries"] == 0 and ex.metrics["blocked_ms"] == 0
+
+
+async def check_stale_keepalive(url):
+    faults(idle_timeout=0.1)
+    ex = make_executor()
+    for _ in range(3):
+        await ex.request("GET", url)
+        await asyncio.sleep(0.2) # Server drops the idle socket meanwhile
+    assert ex.metrics["retries"] == 0 and ex.metrics["failures"] == 0, ex.metrics
+
+
+async def check_other_host(url, other_url):
+    faults()
+    pool = ConnectionPool(max_connections=1)
+    await pool.request("GET", url) # Leaves an idle socket for the first host
+    res = await asyncio.wait_for(pool.request("GET", other_url), 2)
+    assert res.status_code == 200 and pool._open == 1
+
+
+async def handler(reader, writer):
+    # Hung connections are still open at exit; let them end quietly
+    try:
+        await fake_gateway.handle(reader, writer, ARGS)
+    except asyncio.CancelledError:
+        pass
+
+
+async def main():
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    other = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    other_port = other.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/v1/home/machines/LM1/status"
+    other_url = f"http://127.0.0.1:{other_port}/v1/home/machines/LM1/status"
+
+    checks = [check_healthy, check_breaker_cycle, check_cancelled_probe, check_retry_after,
+              check_retry_after_shared, check_pool_queue, check_idempotency, check_drops, check_deadline, check_stale_keepalive]
+    for check in checks:
+        await check(url)
+        print(f"ok  {check.__name__}")
+    await check_other_host(url, other_url)
+    print("ok  check_other_host")
+
+    server.close()
+    other.close()
+
+
+if __name__ == "__main__":
+    # Keep the gateway's per-request logging out of the results
+    fake_gateway.print = lambda *a, **kw: None
+    executor.print = lambda *a, **kw: None
+    asyncio.run(main())
@@ -0,0 +1,261 @@
+# Desktop checks for multi-machine support: LamarzoccoLite against the fake
+# gateway, and PlanetaryUI's per-machine cache against a stub lvgl. Run with
+# CPython:
+#
+#   python tools/check_multi_machine.py
+#
+# uasyncio/ujson and time.ticks_* are shimmed with their CPython
+# equivalents, as in check_executor.py.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.modules["uasyncio"] = asyncio
+sys.modules["ujson"] = json
+asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+time.ticks_ms = lambda: int(time.monotonic() * 1000)
+time.ticks_diff = lambda a, b: a - b
+time.ticks_add = lambda a, b: a + b
+
+
+class _Stub:
+    # Stands in for every lvgl object, constant and function
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+
+sys.modules["lvgl"] = _Stub()
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_gateway
+import lib.executor as executor
+import ui.interface as interface
+from lib.lamarzocco import LamarzoccoLite
+from ui.interface import PlanetaryUI
+
+SERIALS = ["LM1", "LM2", "LM3"]
+ARGS = argparse.Namespace(delay=0, error_rate=0, rate_limit_rate=0, retry_after=1,
+                          drop_rate=0, hang_rate=0, down=False, idle_timeout=0)
+
+interface.SEND_DELAY_MS = 100
+
+
+def make_client(base_url, serials=SERIALS):
+    client = LamarzoccoLite("id", "secret", "me@example.com", "pw", serials, base_url=base_url)
+    client.token = "TEST_TOKEN"
+    return client
+
+
+def reset_gateway(**temps):
+    fake_gateway.MACHINES.clear()
+    for serial, temp in temps.items():
+        fake_gateway.machine_status(f"/machines/{serial}/status")["boiler_target_temperature"] = temp
+
+
+def item(ui, name):
+    for it in ui.items:
+        if it["name"] == name:
+            return it
+    raise KeyError(name)
+
+
+def index_of(ui, name):
+    return ui.items.index(item(ui, name))
+
+
+async def expect_raises(exc_type, coro):
+    try:
+        await coro
+    except exc_type as e:
+        return e
+    raise AssertionError(f"expected {exc_type.__name__}")
+
+
+async def check_validation(base_url):
+    for serials in ([], ["LM1", "LM1"]):
+        try:
+            make_client(base_url, serials)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"accepted {serials}")
+
+    client = make_client(base_url)
+    await expect_raises(ValueError, client.get_status("NOPE"))
+    await expect_raises(ValueError, client.set_steam(2, serial="NOPE"))
+    try:
+        client.select_machine("NOPE")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("selected unknown machine")
+    assert client.executor.metrics["requests"] == 0 # Nothing went out
+
+
+async def check_get_all_status(base_url):
+    reset_gateway(LM1=91.0, LM2=92.0, LM3=93.0)
+    ARGS.delay = 0.2
+    try:
+        client = make_client(base_url)
+        start = time.monotonic()
+        results = await client.get_all_status()
+        elapsed = time.monotonic() - start
+    finally:
+        ARGS.delay = 0
+    # Two pooled sockets, so three 0.2 s requests take two rounds, not three
+    assert elapsed < 0.55, elapsed
+    for serial, temp in (("LM1", 91.0), ("LM2", 92.0), ("LM3", 93.0)):
+        assert results[serial]["boiler_target_temperature"] == temp
+        assert client.machines[serial]["status"] is results[serial]
+    assert client.pool._open <= client.pool.max_connections
+
+
+async def check_select_machine(base_url):
+    reset_gateway(LM1=91.0, LM2=92.0)
+    client = make_client(base_url)
+    await client.get_all_status()
+    sent = client.executor.metrics["requests"]
+    assert client.select_machine("LM2")["boiler_target_temperature"] == 92.0
+    assert client.serial == "LM2" and client.status["boiler_target_temperature"] == 92.0
+    assert client.executor.metrics["requests"] == sent # Switching is local
+
+
+async def check_poll_stagger(base_url):
+    reset_gateway()
+    client = make_client(base_url)
+    first_fetch = {}
+    fetch = client.get_status
+
+    async def recording_get_status(serial=None):
+        first_fetch.setdefault(serial, time.monotonic())
+        return await fetch(serial)
+
+    client.get_status = recording_get_status
+    start = time.monotonic()
+    task = asyncio.create_task(client.poll(0.6))
+    await asyncio.sleep(0.5)
+    task.cancel()
+    await expect_raises(asyncio.CancelledError, task)
+
+    # Machine i starts at i * interval / N
+    for i, serial in enumerate(SERIALS):
+        offset = first_fetch[serial] - start
+        assert abs(offset - i * 0.2) < 0.05, (serial, offset)
+
+
+async def check_ui_cache(base_url):
+    reset_gateway(LM1=91.0, LM2=95.0)
+    client = make_client(base_url, ["LM1", "LM2"])
+    await client.get_all_status()
+    ui = PlanetaryUI(None, None, None, client)
+
+    # Seeded from the polled status, not the hardcoded defaults
+    assert item(ui, "Temp")["value"] == 91.0
+    assert item(ui, "Machine")["value"] == "LM1"
+
+    # Switching shows the other machine's cached state without a request
+    sent = client.executor.metrics["requests"]
+    ui._on_icon_click(index_of(ui, "Machine"))
+    ui._adjust_value(1)
+    assert client.serial == "LM2" and item(ui, "Temp")["value"] == 95.0
+    assert client.executor.metrics["requests"] == sent
+
+    # A poll for the machine on screen is picked up
+    fake_gateway.machine_status("/machines/LM2/status")["steam_level"] = 3
+    await client.get_status("LM2")
+    assert ui._sync_status("LM2")
+    ui._load_values("LM2")
+    assert item(ui, "Steam")["value"] == 3
+
+
+async def check_ui_edit_not_reverted(base_url):
+    reset_gateway(LM1=93.0)
+    client = make_client(base_url, ["LM1", "LM2"])
+    await client.get_all_status()
+    ui = PlanetaryUI(None, None, None, client)
+
+    ui._on_icon_click(index_of(ui, "Temp"))
+    for _ in range(10):
+        ui._adjust_value(1)
+    assert item(ui, "Temp")["value"] == 94.0
+
+    # A poll lands while the edit is pending; it still says 93.0
+    await client.get_status("LM1")
+    assert not ui._sync_status("LM1")
+    assert item(ui, "Temp")["value"] == 94.0
+
+    # After the send, that old poll must not come back and revert the knob
+    await asyncio.sleep(0.3)
+    assert fake_gateway.MACHINES["LM1"]["boiler_target_temperature"] == 94.0
+    assert not ui._sync_status("LM1")
+    assert item(ui, "Temp")["value"] == 94.0
+
+    # A poll fetched after the send is applied as usual
+    await client.get_status("LM1")
+    assert ui._sync_status("LM1")
+    ui._load_values("LM1")
+    assert item(ui, "Temp")["value"] == 94.0
+
+
+async def check_ui_sends_per_item(base_url):
+    reset_gateway()
+    client = make_client(base_url, ["LM1", "LM2"])
+    await client.get_all_status()
+    ui = PlanetaryUI(None, None, None, client)
+
+    # Edit Temp, then Steam, then switch machine and toggle Power, all inside the delay
+    ui._on_icon_click(index_of(ui, "Temp"))
+    ui._adjust_value(5)
+    temp_task = ui.send_timer_tasks[("LM1", "Temp")]
+    ui._on_center_click(None)
+    ui._on_icon_click(index_of(ui, "Steam"))
+    ui._adjust_value(1)
+    ui._on_center_click(None)
+    ui._on_icon_click(index_of(ui, "Machine"))
+    ui._adjust_value(1)
+    ui._on_center_click(None)
+    ui._on_icon_click(index_of(ui, "Power"))
+    ui._adjust_value(1)
+
+    await asyncio.sleep(0.3)
+    assert not temp_task.cancelled()
+    assert ui.send_timer_tasks == {}
+    lm1 = fake_gateway.MACHINES["LM1"]
+    assert lm1["boiler_target_temperature"] == 93.5 and lm1["steam_level"] == 3, lm1
+    assert fake_gateway.MACHINES["LM2"]["status"] == "STANDBY"
+
+
+async def handler(reader, writer):
+    try:
+        await fake_gateway.handle(reader, writer, ARGS)
+    except asyncio.CancelledError:
+        pass
+
+
+async def main():
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/v1/home"
+
+    checks = [check_validation, check_get_all_status, check_select_machine, check_poll_stagger,
+              check_ui_cache, check_ui_edit_not_reverted, check_ui_sends_per_item]
+    for check in checks:
+        await check(base_url)
+        print(f"ok  {check.__name__}")
+
+    server.close()
+
+
+if __name__ == "__main__":
+    # Keep request logging out of the results
+    fake_gateway.print = lambda *a, **kw: None
+    executor.print = lambda *a, **kw: None
+    interface.print = lambda *a, **kw: None
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+# Local stand-in for the La Marzocco gateway, for exercising the request
+# executor's retries and circuit breaker. Runs on a desktop with CPython:
+#
+#   python tools/fake_gateway.py --error-rate 0.3 --drop-rate 0.1
+#
+# then set config.LM_BASE_URL = "http://<your-pc-ip>:8080/v1/home"
+# and watch lm_client.executor.metrics on the board.
+import argparse
+import asyncio
+import json
+import random
+
+STATUS = {"status": "ON", "boiler_target_temperature": 93.0, "steam_level": 2}
+MACHINES = {} # serial -> that machine's status, created from STATUS on first use
+
+
+def machine_status(path):
+    # ".../machines/<serial>/<endpoint>"
+    parts = path.split("/")
+    serial = parts[parts.index("machines") + 1] if "machines" in parts else ""
+    if serial not in MACHINES:
+        MACHINES[serial] = dict(STATUS)
+    return MACHINES[serial]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Fake La Marzocco gateway with fault injection")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--delay", type=float, default=0, help="Seconds to wait before every response")
+    p.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with 503")
+    p.add_argument("--rate-limit-rate", type=float, default=0, help="Fraction answered with 429")
+    p.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds sent with 429s")
+    p.add_argument("--drop-rate", type=float, default=0, help="Fraction of connections dropped without a reply")
+    p.add_argument("--hang-rate", type=float, default=0, help="Fraction of requests that never get a reply")
+    p.add_argument("--down", action="store_true", help="Answer everything with 503 (dead gateway)")
+    p.add_argument("--idle-timeout", type=float, default=0, help="Close keep-alive connections idle this long (0 = never)")
+    return p.parse_args()
+
+
+def respond(writer, status, reason, body=b"", extra=None):
+    head = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body)}", "Content-Type: application/json"]
+    for name, value in (extra or {}).items():
+        head.append(f"{name}: {value}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+
+async def handle(reader, writer, args):
+    try:
+        while True:
+            if args.idle_timeout:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), args.idle_timeout)
+                except asyncio.TimeoutError:
+                    print("  -> idle close")
+                    break
+            else:
+                request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode().split(" ", 2)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode().partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length) if length else b""
+
+            roll = random.random()
+            print(f"{method} {path} {body.decode()}")
+            if args.delay:
+                await asyncio.sleep(args.delay)
+
+            if roll < args.drop_rate:
+                print("  -> dropped")
+                break
+            roll -= args.drop_rate
+            if roll < args.hang_rate:
+                print("  -> hanging")
+                await asyncio.sleep(3600)
+                break
+            roll -= args.hang_rate
+            if args.down or roll < args.error_rate:
+                print("  -> 503")
+                respond(writer, 503, "Service Unavailable")
+            elif roll - args.error_rate < args.rate_limit_rate:
+                print("  -> 429")
+                respond(writer, 429, "Too Many Requests", extra={"Retry-After": args.retry_after})
+            elif method == "GET" and path.endswith("/status"):
+                respond(writer, 200, "OK", json.dumps(machine_status(path)).encode())
+            elif method == "POST":
+                machine_status(path).update(json.loads(body or b"{}"))
+                respond(writer, 200, "OK", b"{}")
+            else:
+                respond(writer, 404, "Not Found")
+            await writer.drain()
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    args = parse_args()
+    server = await asyncio.start_server(lambda r, w: handle(r, w, args), "0.0.0.0", args.port)
+    print(f"Fake gateway listening on :{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,6 +10,19 @@ ICON_SIZE = 60
 CENTER_SIZE = 120
 SEND_DELAY_MS = 2000 # 2 seconds delay before sending
 
+def _values_from_status(status):
+    # Map the gateway's status fields onto item names; unknown fields are ignored
+    values = {}
+    if "status" in status:
+        values["Power"] = "ON" if status["status"] == "ON" else "OFF"
+    if "boiler_target_temperature" in status:
+        values["Temp"] = round(float(status["boiler_target_temperature"]), 1)
+    if "steam_level" in status:
+        values["Steam"] = int(status["steam_level"])
+    if "preinfusion_enabled" in status:
+        values["Pre-Inf"] = "ON" if status["preinfusion_enabled"] else "OFF"
+    return values
+
 class PlanetaryUI:
     def __init__(self, display_driver, touch_driver, encoder_driver, machine_client):
         self.disp = display_driver
@@ -30,10 +43,26 @@ class PlanetaryUI:
             {"name": "Stats", "icon": lv.SYMBOL.LIST, "value": "--", "type": "info"},
         ]
         
+        # Machine selector, only shown when there is more than one machine
+        if len(self.client.serials) > 1:
+            self.items.append({"name": "Machine", "icon": lv.SYMBOL.HOME, "value": self.client.serial, "type": "machine"})
+        
         self.icon_objs = []
         self.selected_idx = -1 # No selection initially
         self.active_mode = False # False = Perimeter, True = Center/Editing
-        self.send_timer_task = None
+        self.send_timer_tasks = {} # Pending auto-send per (serial, item name)
+        self.min_status_seq = {} # serial -> oldest status fetch still worth showing
+        self.offline = False # Mirrors the client's circuit breaker
+        
+        # Cached item values per machine so switching never waits on the network.
+        # Seeded with the defaults, then refreshed from each polled status.
+        defaults = self._snapshot_values()
+        self.machine_values = {}
+        self.applied_status = {} # serial -> last status dict folded into machine_values
+        for serial in self.client.serials:
+            self.machine_values[serial] = dict(defaults)
+            self._sync_status(serial)
+        self._load_values(self.client.serial)
         
         self._init_ui()
         self._update_layout()
@@ -74,6 +103,54 @@ class PlanetaryUI:
             
             self.icon_objs.append(obj)
 
+    def _snapshot_values(self):
+        values = {}
+        for item in self.items:
+            if item["type"] != "machine":
+                values[item["name"]] = item["value"]
+        return values
+
+    def _has_pending_send(self, serial):
+        for key in self.send_timer_tasks:
+            if key[0] == serial:
+                return True
+        return False
+
+    def _sync_status(self, serial):
+        # Fold a newly polled status into the cache. get_status() replaces the
+        # dict on every fetch, so identity tells us whether it's new. Skipped
+        # while an edit is waiting to be sent, and statuses fetched before the
+        # last send finished are ignored for good, so a poll can't undo the knob.
+        machine = self.client.machines[serial]
+        status = machine["status"]
+        if not status or status is self.applied_status.get(serial):
+            return False
+        if self._has_pending_send(serial):
+            return False
+        if machine["status_seq"] < self.min_status_seq.get(serial, 0):
+            return False
+        self.applied_status[serial] = status
+        if serial == self.client.serial:
+            # On screen: the items hold the freshest values, not the cache
+            self.machine_values[serial] = self._snapshot_values()
+        self.machine_values[serial].update(_values_from_status(status))
+        return True
+
+    def _load_values(self, serial):
+        cached = self.machine_values[serial]
+        for item in self.items:
+            if item["type"] == "machine":
+                item["value"] = serial
+            elif item["name"] in cached:
+                item["value"] = cached[item["name"]]
+
+    def _select_machine(self, serial):
+        # Park the current machine's values and load the cached ones for the new one
+        self.machine_values[self.client.serial] = self._snapshot_values()
+        self._sync_status(serial)
+        self.client.select_machine(serial)
+        self._load_values(serial)
+
     def _on_icon_click(self, index):
         if self.active_mode and self.selected_idx == index:
             return # Already active
@@ -98,8 +175,12 @@ class PlanetaryUI:
         if self.active_mode and self.selected_idx >= 0:
             item = self.items[self.selected_idx]
             self.center_label.set_text(f"{item['name']}\n{item['value']}")
+        elif self.offline:
+            self.center_label.set_text("Offline")
         else:
-            self.center_label.set_text("Ready")
+            self.center_label.set_text("Ready" if len(self.client.serials) == 1 else self.client.serial)
+        # Red ring while the gateway is unreachable
+        self.center_obj.set_style_border_color(lv.color_hex(0xFF0000 if self.offline else 0xFFFFFF), 0)
 
         for i, obj in enumerate(self.icon_objs):
             if self.active_mode and i == self.selected_idx:
@@ -147,6 +228,17 @@ class PlanetaryUI:
             
             # Handle Touch is done via LVGL events
             
+            # Pick up the latest poll for the machine on screen
+            serial = self.client.serial
+            if self._sync_status(serial):
+                self._load_values(serial)
+                self._update_layout()
+            
+            # Breaker state only changes on request boundaries, redraw on transitions
+            if self.client.offline != self.offline:
+                self.offline = self.client.offline
+                self._update_layout()
+            
             lv.task_handler()
             await asyncio.sleep(0.02)
 
@@ -154,7 +246,9 @@ class PlanetaryUI:
         item = self.items[self.selected_idx]
         
         # Logic to change values based on type
-        if item["type"] == "float":
+        if item["type"] == "info":
+            return # Read-only
+        elif item["type"] == "float":
             item["value"] += diff * 0.1
             item["value"] = round(item["value"], 1)
         elif item["type"] == "int":
@@ -163,21 +257,42 @@ class PlanetaryUI:
             if diff != 0:
                 val = item["value"]
                 item["value"] = "OFF" if val == "ON" else "ON"
+        elif item["type"] == "machine":
+            serials = self.client.serials
+            idx = (serials.index(self.client.serial) + diff) % len(serials)
+            self._select_machine(serials[idx])
+            # Switching is local only, nothing to send
+            self._update_layout()
+            return
         
         # Update UI immediately
         self._update_layout()
         
-        # Schedule Auto-Send
-        if self.send_timer_task:
-            self.send_timer_task.cancel()
-        self.send_timer_task = asyncio.create_task(self._auto_send_delay())
+        # Schedule Auto-Send, one per machine and item so neither switching
+        # machines nor editing another item drops a pending edit
+        key = (self.client.serial, item["name"])
+        if key in self.send_timer_tasks:
+            self.send_timer_tasks[key].cancel()
+        self.send_timer_tasks[key] = asyncio.create_task(self._auto_send_delay(key, item["value"]))
 
-    async def _auto_send_delay(self):
+    async def _auto_send_delay(self, key, value):
+        serial, name = key
         try:
             await asyncio.sleep_ms(SEND_DELAY_MS)
-            print(f"Auto-sending value for {self.items[self.selected_idx]['name']}")
-            # Call API here
-            # await self.client.set_something(...)
-            self.send_timer_task = None
+            print(f"Auto-sending {name}={value} to {serial}")
+            await self._send_value(name, value, serial)
+            # Anything fetched before now predates the command
+            self.min_status_seq[serial] = self.client.status_seq
+            del self.send_timer_tasks[key]
         except asyncio.CancelledError:
             pass
+
+    async def _send_value(self, name, value, serial):
+        if name == "Power":
+            await self.client.set_power(value == "ON", serial=serial)
+        elif name == "Temp":
+            await self.client.set_temp(value, serial=serial)
+        elif name == "Steam":
+            await self.client.set_steam(value, serial=serial)
+        elif name == "Pre-Inf":
+            await self.client.set_preinfusion(value == "ON", serial=serial)